@@ -0,0 +1,257 @@
+"""对话上下文服务 - 为多轮对话组装发送给 LLM 的消息"""
+
+import asyncio
+import re
+from typing import List, Dict, Any, Optional, Tuple
+
+from app.core.config import settings
+from app.core.logger import logger
+from app.services.ollama_client import get_ollama_client
+from app.services.rag_service import get_rag_service
+from app.models.schemas import DocumentSource
+
+
+class ChatContextService:
+    """对话上下文服务类
+
+    负责检索、历史窗口与早期对话摘要，以及最终发送给 LLM 的消息组装。
+    """
+
+    # 摘要生成后，未摘要的对话最多再累积多少轮才并入摘要
+    SUMMARY_REFRESH_TURNS = 4
+
+    HISTORY_SUMMARY_PROMPT = "请将以下健身教练与用户的对话压缩为简短摘要，保留用户的身体状况、健身目标、训练经验和已给出的关键建议，不超过200字。"
+
+    # 推理模型（如 deepseek-r1）输出中的思考过程
+    THINK_PATTERN = re.compile(r"<think>.*?</think>", re.DOTALL)
+
+    def __init__(self):
+        self.rag_service = get_rag_service()
+        self.ollama_client = get_ollama_client()
+
+        # 对话摘要: 对话ID -> {"summary": 摘要, "until": 摘要覆盖的最后一条消息的时间}
+        self._summaries: Dict[str, Dict[str, Any]] = {}
+
+        # 正在后台生成的摘要任务: 对话ID -> 任务
+        self._summary_tasks: Dict[str, asyncio.Task] = {}
+
+    def _history_limit(self) -> int:
+        """未摘要对话的最大消息数，达到后并入摘要
+
+        ConversationManager 只保留最近 max_history_length * 2 条消息，
+        上限不能超过该容量，否则消息会在并入摘要之前被裁掉。
+        取偶数，使截取的窗口从用户消息开始。
+        """
+        limit = min(
+            settings.max_history_length + self.SUMMARY_REFRESH_TURNS * 2,
+            settings.max_history_length * 2
+        )
+        return limit - limit % 2
+
+    def _keep_length(self) -> int:
+        """生成摘要后原样保留的消息数（偶数，且至少留出一轮对话用于摘要）"""
+        keep = settings.max_history_length + settings.max_history_length % 2
+        return max(min(keep, self._history_limit() - 2), 0)
+
+    def _unsummarized(self, conversation_id: str, messages: List) -> List:
+        """返回摘要尚未覆盖的消息"""
+        state = self._summaries.get(conversation_id)
+        if not state:
+            return list(messages)
+        return [msg for msg in messages if msg.timestamp > state["until"]]
+
+    def window_history(
+        self,
+        conversation_id: str,
+        messages: List
+    ) -> Tuple[List[Dict[str, str]], Optional[str]]:
+        """取出摘要之后的对话及摘要
+
+        未摘要的对话增长到 _history_limit 条后，由 schedule_summary 在后台
+        并入摘要。摘要按时完成时，每条消息都在窗口或摘要之中。
+
+        Args:
+            conversation_id: 对话ID
+            messages: 不含当前问题的对话消息
+
+        Returns:
+            (摘要之后的对话, 摘要或None)
+        """
+        pending = self._unsummarized(conversation_id, messages)[-self._history_limit():]
+
+        # 存储裁剪后窗口可能以失去问题的助手回答开头，去掉以保持轮次完整
+        while pending and pending[0].role.value != "user":
+            pending = pending[1:]
+
+        state = self._summaries.get(conversation_id)
+        return (
+            [{"role": msg.role.value, "content": msg.content} for msg in pending],
+            state["summary"] if state else None
+        )
+
+    async def _refresh_summary(self, conversation_id: str, messages: List):
+        """将窗口之前的对话与已有摘要合并为新摘要"""
+        pending = self._unsummarized(conversation_id, messages)
+        earlier = pending[:len(pending) - self._keep_length()]
+        if not earlier:
+            return
+
+        state = self._summaries.get(conversation_id)
+        transcript = "\n".join(
+            f"{'用户' if msg.role.value == 'user' else '教练'}: {msg.content}"
+            for msg in earlier
+        )
+        if state:
+            transcript = f"此前对话摘要：{state['summary']}\n\n{transcript}"
+
+        try:
+            response = await self.ollama_client.chat(
+                messages=[
+                    {"role": "system", "content": self.HISTORY_SUMMARY_PROMPT},
+                    {"role": "user", "content": transcript}
+                ],
+                temperature=0.3,
+                # 推理模型会先输出思考过程，预留与普通回答相同的 token 预算
+                max_tokens=settings.max_tokens_per_message
+            )
+        except Exception as e:
+            logger.error(f"生成对话摘要失败: {e}")
+            return
+
+        summary = self.THINK_PATTERN.sub("", response).strip()
+        if not summary or "<think>" in summary:
+            # 思考过程被截断时没有可用的摘要
+            logger.warning(f"对话摘要不完整，保留原摘要: {conversation_id}")
+            return
+
+        self._summaries[conversation_id] = {"summary": summary, "until": earlier[-1].timestamp}
+
+    def schedule_summary(self, conversation_id: str, messages: List):
+        """未摘要的对话达到上限时，在后台更新摘要
+
+        摘要在用户输入下一个问题期间生成。Ollama 默认逐个处理请求，
+        若摘要尚未完成就发起下一轮回答，该回答会排在摘要请求之后。
+
+        Args:
+            conversation_id: 对话ID
+            messages: 对话的全部消息
+        """
+        task = self._summary_tasks.get(conversation_id)
+        if task and not task.done():
+            return
+        if len(self._unsummarized(conversation_id, messages)) < self._history_limit():
+            return
+
+        self._summary_tasks[conversation_id] = asyncio.create_task(
+            self._refresh_summary(conversation_id, list(messages))
+        )
+
+    def retrieve(
+        self,
+        query_embedding: List[float],
+        top_k: Optional[int] = None
+    ) -> List[DocumentSource]:
+        """使用已生成的查询向量检索相关文档
+
+        与 RAGService.retrieve 的结果一致（余弦距离转换为相似度并按阈值过滤），
+        但直接复用调用方已有的查询向量，不再请求一次嵌入接口。
+
+        Args:
+            query_embedding: 查询向量
+            top_k: 返回结果数量
+
+        Returns:
+            检索结果列表
+        """
+        vector_store = self.rag_service.vector_store
+
+        try:
+            results = vector_store.collection.query(
+                query_embeddings=[query_embedding],
+                n_results=top_k or vector_store.top_k,
+                include=["documents", "metadatas", "distances"]
+            )
+        except Exception as e:
+            logger.error(f"检索失败: {e}")
+            return []
+
+        sources = []
+        if results["ids"] and results["ids"][0]:
+            for i in range(len(results["ids"][0])):
+                # 将距离转换为相似度分数 (cosine distance -> similarity)
+                score = round(1 - results["distances"][0][i], 4)
+                if score < self.rag_service.similarity_threshold:
+                    continue
+
+                metadata = results["metadatas"][0][i] or {}
+                sources.append(DocumentSource(
+                    content=results["documents"][0][i],
+                    source=metadata.get("source", "unknown"),
+                    score=score,
+                    metadata=metadata
+                ))
+
+        logger.info(f"检索到 {len(sources)} 条相关文档")
+        return sources
+
+    def build_messages(
+        self,
+        query: str,
+        sources: List[DocumentSource],
+        conversation_history: Optional[List[Dict[str, str]]] = None,
+        history_summary: Optional[str] = None
+    ) -> List[Dict[str, str]]:
+        """构建 RAG 对话消息
+
+        按 [系统提示词] + [早期对话摘要] + [历史对话] + [参考资料与当前问题] 排列，
+        检索结果只出现在最后一条用户消息中，使前面的消息在多轮之间保持不变，
+        从而命中 Ollama 的提示词前缀缓存，减少每轮的 prefill 开销。
+
+        Args:
+            query: 用户查询
+            sources: 检索到的文档
+            conversation_history: 对话历史（调用方负责截取窗口）
+            history_summary: 早期对话摘要
+
+        Returns:
+            消息列表，格式 [{"role": "user", "content": "..."}, ...]
+        """
+        messages = [{"role": "system", "content": self.rag_service.FITNESS_COACH_SYSTEM_PROMPT}]
+
+        if history_summary:
+            messages.append({"role": "system", "content": f"此前对话摘要：{history_summary}"})
+
+        if conversation_history:
+            for msg in conversation_history:
+                messages.append({"role": msg["role"], "content": msg["content"]})
+
+        context_parts = [
+            f"[参考{i}] {doc.content}\n来源: {doc.source}"
+            for i, doc in enumerate(sources, 1)
+        ]
+        context = "\n\n".join(context_parts) if context_parts else "无相关参考资料"
+
+        messages.append({
+            "role": "user",
+            "content": f"""以下是相关的参考资料：
+
+{context}
+
+用户问题：{query}
+
+请基于参考资料和你的专业知识，以专业健身教练的身份回答用户的问题。如果参考资料中有相关信息，请优先使用。回答要具体、实用、有针对性。"""
+        })
+
+        return messages
+
+
+# 全局对话上下文服务实例
+_chat_context_service: Optional[ChatContextService] = None
+
+
+def get_chat_context_service() -> ChatContextService:
+    """获取对话上下文服务单例"""
+    global _chat_context_service
+    if _chat_context_service is None:
+        _chat_context_service = ChatContextService()
+    return _chat_context_service
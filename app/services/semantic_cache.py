@@ -0,0 +1,167 @@
+"""语义回答缓存 - 对相近问题直接复用已生成的回答"""
+
+import re
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from app.core.logger import logger
+from app.services.ollama_client import get_ollama_client
+from app.models.schemas import DocumentSource
+
+
+class SemanticCache:
+    """语义缓存
+
+    以问题的嵌入向量为键，按余弦相似度匹配已缓存的回答。
+    相似度达到阈值即视为命中，跳过检索和 LLM 生成。
+    依赖上文才能理解的追问不参与缓存，见 is_context_dependent。
+    """
+
+    # 指代上文的中文表达
+    CONTEXT_MARKERS = (
+        "这", "那", "它", "上面", "刚才", "之前", "前面",
+        "继续", "详细", "具体", "为什么", "还有", "然后"
+    )
+
+    # 指代上文的英文表达
+    CONTEXT_PATTERN = re.compile(
+        r"\b(it|its|this|that|these|those|them|why|more|again|above|previous)\b",
+        re.IGNORECASE
+    )
+
+    # 不超过该长度的问题通常是追问，不参与缓存
+    SHORT_QUERY_LENGTH = 6
+
+    def __init__(self, similarity_threshold: float = 0.95, max_entries: int = 256):
+        self.similarity_threshold = similarity_threshold
+        self.max_entries = max_entries
+        self.ollama_client = get_ollama_client()
+
+        # 归一化后的嵌入矩阵，每行对应 _entries 中的一项
+        self._embeddings: Optional[np.ndarray] = None
+        self._entries: List[Tuple[str, str, List[DocumentSource]]] = []
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> Optional[np.ndarray]:
+        """归一化嵌入向量，空向量返回 None"""
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if vector.size == 0 or norm == 0:
+            return None
+        return vector / norm
+
+    def is_context_dependent(self, query: str) -> bool:
+        """判断问题是否依赖上文
+
+        “为什么？”“能详细说说吗？”这类追问的含义取决于前面的对话，
+        同样的文字在不同上下文中需要不同的回答，不能按问题文本复用缓存。
+
+        Args:
+            query: 问题文本
+
+        Returns:
+            是否依赖上文
+        """
+        text = query.strip()
+        if len(text) <= self.SHORT_QUERY_LENGTH:
+            return True
+        if any(marker in text for marker in self.CONTEXT_MARKERS):
+            return True
+        return bool(self.CONTEXT_PATTERN.search(text))
+
+    async def embed(self, text: str) -> List[float]:
+        """生成问题的嵌入向量
+
+        Args:
+            text: 问题文本
+
+        Returns:
+            嵌入向量，失败时返回空列表（此时缓存不参与本轮问答）
+        """
+        try:
+            return await self.ollama_client.generate_embedding(text)
+        except Exception as e:
+            logger.error(f"语义缓存生成嵌入向量失败: {e}")
+            return []
+
+    def lookup(
+        self,
+        embedding: List[float],
+        namespace: str = ""
+    ) -> Optional[Tuple[str, List[DocumentSource]]]:
+        """查找语义相近的缓存回答
+
+        Args:
+            embedding: 问题的嵌入向量
+            namespace: 命名空间（如对话ID），只在同一命名空间内匹配
+
+        Returns:
+            (回答, 引用的文档) 或 None
+        """
+        query = self._normalize(embedding)
+        if query is None or self._embeddings is None:
+            return None
+        if query.shape[0] != self._embeddings.shape[1]:
+            return None
+
+        scores = self._embeddings @ query
+        for index in np.argsort(scores)[::-1]:
+            if scores[index] < self.similarity_threshold:
+                break
+            entry_namespace, answer, sources = self._entries[index]
+            if entry_namespace == namespace:
+                logger.info(f"语义缓存命中 (相似度: {scores[index]:.4f})")
+                return answer, sources
+
+        return None
+
+    def put(
+        self,
+        embedding: List[float],
+        answer: str,
+        sources: List[DocumentSource],
+        namespace: str = ""
+    ):
+        """写入缓存
+
+        Args:
+            embedding: 问题的嵌入向量
+            answer: 生成的回答
+            sources: 引用的文档
+            namespace: 命名空间
+        """
+        vector = self._normalize(embedding)
+        if vector is None or not answer:
+            return
+
+        if self._embeddings is None or self._embeddings.shape[1] != vector.shape[0]:
+            self._embeddings = vector[np.newaxis, :]
+            self._entries = [(namespace, answer, sources)]
+            return
+
+        self._embeddings = np.vstack([self._embeddings, vector])
+        self._entries.append((namespace, answer, sources))
+
+        # 超出容量时淘汰最早的条目
+        if len(self._entries) > self.max_entries:
+            overflow = len(self._entries) - self.max_entries
+            self._embeddings = self._embeddings[overflow:]
+            self._entries = self._entries[overflow:]
+
+    def clear(self):
+        """清空缓存"""
+        self._embeddings = None
+        self._entries = []
+
+
+# 全局语义缓存实例
+_semantic_cache: Optional[SemanticCache] = None
+
+
+def get_semantic_cache() -> SemanticCache:
+    """获取语义缓存单例"""
+    global _semantic_cache
+    if _semantic_cache is None:
+        _semantic_cache = SemanticCache()
+    return _semantic_cache
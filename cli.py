@@ -3,9 +3,16 @@
 
 import asyncio
 import sys
+import threading
 from typing import Optional
 from pathlib import Path
 
+try:
+    from uvloop import run as run_async
+except ImportError:
+    # Windows 等平台没有 uvloop，回退到默认事件循环
+    from asyncio import run as run_async
+
 import typer
 from rich.console import Console
 from rich.panel import Panel
@@ -17,15 +24,41 @@ from rich import box
 
 from app.core.config import settings
 from app.core.logger import logger
-from app.services.rag_service import get_rag_service
-from app.services.conversation_manager import get_conversation_manager, MessageRole
-from app.services.ollama_client import get_ollama_client
+# 服务模块依赖 ChromaDB、httpx、NumPy 等较重的库，在各命令内部按需导入，
+# 使 --help 和对话管理等简单命令无需加载它们
 
 
 app = typer.Typer(help="AI 健身教练 - 命令行交互工具")
 console = Console()
 
 
+async def ask_user(prompt: str) -> str:
+    """在后台线程中读取用户输入，等待输入期间事件循环仍可处理其他任务
+    
+    使用守护线程而不是默认线程池：按 Ctrl+C 退出时，
+    阻塞在 input() 上的线程不会拖住事件循环的关闭。
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+    
+    def set_result(result: str):
+        if not future.done():
+            future.set_result(result)
+    
+    def set_exception(error: BaseException):
+        if not future.done():
+            future.set_exception(error)
+    
+    def read_input():
+        try:
+            loop.call_soon_threadsafe(set_result, Prompt.ask(prompt))
+        except BaseException as e:
+            loop.call_soon_threadsafe(set_exception, e)
+    
+    threading.Thread(target=read_input, daemon=True).start()
+    return await future
+
+
 def print_banner():
     """打印欢迎横幅"""
     banner = """
@@ -47,6 +80,12 @@ def chat(
     no_rag: bool = typer.Option(False, "--no-rag", help="不使用知识库检索")
 ):
     """启动交互式对话"""
+    from app.services.rag_service import get_rag_service
+    from app.services.conversation_manager import get_conversation_manager, MessageRole
+    from app.services.ollama_client import get_ollama_client
+    from app.services.semantic_cache import get_semantic_cache
+    from app.services.chat_context import get_chat_context_service
+    
     print_banner()
     
     # 检查服务状态
@@ -70,53 +109,73 @@ def chat(
             console.print(f"[yellow]⚠ LLM模型 {settings.ollama_llm_model} 未找到[/yellow]")
             console.print(f"[dim]  请执行: ollama pull {settings.ollama_llm_model}[/dim]")
     
-    asyncio.run(check_services())
-    
-    # 初始化服务
-    rag_service = get_rag_service()
-    conversation_manager = get_conversation_manager()
-    
     # 获取或创建对话
-    if conversation_id:
-        conversation = conversation_manager.get_conversation(conversation_id)
-        if not conversation:
-            console.print(f"[red]对话 {conversation_id} 不存在[/red]")
-            raise typer.Exit(1)
-        current_id = conversation_id
-        console.print(f"[dim]继续对话: {conversation.title}[/dim]")
-    else:
+    def open_conversation() -> str:
+        conversation_manager = get_conversation_manager()
+        
+        if conversation_id:
+            conversation = conversation_manager.get_conversation(conversation_id)
+            if not conversation:
+                console.print(f"[red]对话 {conversation_id} 不存在[/red]")
+                raise typer.Exit(1)
+            console.print(f"[dim]继续对话: {conversation.title}[/dim]")
+            return conversation_id
+        
         conversation = conversation_manager.create_conversation()
-        current_id = conversation.id
         console.print(f"[dim]创建新对话: {conversation.id[:8]}...[/dim]")
-    
-    console.print("\n[dim]输入你的健身问题，输入 'quit' 或 'exit' 退出，输入 'help' 查看帮助[/dim]\n")
-    
-    async def interactive_chat():
+        return conversation.id
+    
+    async def interactive_chat(current_id: str):
+        # 初始化服务
+        rag_service = get_rag_service()
+        conversation_manager = get_conversation_manager()
+        semantic_cache = get_semantic_cache()
+        chat_context = get_chat_context_service()
+        
+        def quit_chat(_: str) -> bool:
+            console.print("[dim]再见！坚持锻炼，保持健康！💪[/dim]")
+            return False
+        
+        def show_help(_: str) -> bool:
+            print_help()
+            return True
+        
+        def show_history(_: str) -> bool:
+            show_conversation_history(current_id)
+            return True
+        
+        def new_conversation(title: str) -> bool:
+            nonlocal current_id
+            conversation = conversation_manager.create_conversation(title or None)
+            current_id = conversation.id
+            console.print(f"[green]✓ 创建新对话: {conversation.title}[/green]\n")
+            return True
+        
+        # 命令处理函数，返回 False 表示退出对话
+        commands = {
+            "quit": quit_chat,
+            "exit": quit_chat,
+            "q": quit_chat,
+            "help": show_help,
+            "history": show_history,
+            "new": new_conversation,
+        }
+        
         while True:
             try:
                 # 获取用户输入
-                user_input = Prompt.ask("[bold blue]你[/bold blue]")
-                
-                if user_input.lower() in ["quit", "exit", "q"]:
-                    console.print("[dim]再见！坚持锻炼，保持健康！💪[/dim]")
-                    break
+                user_input = await ask_user("[bold blue]你[/bold blue]")
                 
-                if user_input.lower() == "help":
-                    print_help()
-                    continue
+                command, _, argument = user_input.strip().partition(" ")
+                handler = commands.get(command.lower())
                 
-                if user_input.lower() == "history":
-                    show_conversation_history(current_id)
+                # 只有 new 接受参数，其余命令需整行匹配，避免把普通问题当成命令
+                if handler and (not argument or handler is new_conversation):
+                    if not handler(argument.strip()):
+                        break
                     continue
                 
-                if user_input.lower().startswith("new "):
-                    new_title = user_input[4:].strip()
-                    conversation = conversation_manager.create_conversation(new_title or None)
-                    current_id = conversation.id
-                    console.print(f"[green]✓ 创建新对话: {conversation.title}[/green]\n")
-                    continue
-                
-                if not user_input.strip():
+                if not command:
                     continue
                 
                 # 添加用户消息
@@ -126,31 +185,71 @@ def chat(
                     content=user_input
                 )
                 
-                # 获取对话历史
-                history = conversation_manager.get_conversation_history(current_id)
-                
-                # 生成回答
-                with Progress(
-                    SpinnerColumn(),
-                    TextColumn("[progress.description]{task.description}"),
-                    console=console,
-                    transient=True
-                ) as progress:
-                    task = progress.add_task("[cyan]思考中...", total=None)
+                # 生成回答，流式输出到终端
+                console.print(f"\n[bold green]AI 健身教练[/bold green]")
+                with console.status("[cyan]思考中...", spinner="dots"):
+                    stream = None
                     
                     if no_rag:
                         # 不使用RAG，直接生成
                         ollama_client = get_ollama_client()
-                        answer = await ollama_client.generate(
+                        stream = ollama_client.generate_stream(
                             prompt=user_input,
                             system_prompt=rag_service.FITNESS_COACH_SYSTEM_PROMPT
                         )
                         sources = []
                     else:
-                        # 使用RAG
-                        answer, sources = await rag_service.generate_answer(
-                            query=user_input,
-                            conversation_history=history[:-1]
+                        # 使用RAG，语义相近的问题直接复用缓存回答，依赖上文的追问不参与缓存
+                        # 问题的嵌入向量由缓存匹配和知识库检索共用
+                        cacheable = not semantic_cache.is_context_dependent(user_input)
+                        query_embedding = await semantic_cache.embed(user_input)
+                        hit = None
+                        if cacheable:
+                            hit = semantic_cache.lookup(query_embedding, namespace=current_id)
+                        if hit:
+                            answer, sources = hit
+                        else:
+                            if query_embedding:
+                                sources = chat_context.retrieve(query_embedding)
+                            else:
+                                # 嵌入失败时退回 RAG 服务自带的检索
+                                sources = await rag_service.retrieve(user_input)
+                            recent_history, history_summary = chat_context.window_history(
+                                current_id,
+                                conversation_manager.get_conversation(current_id).messages[:-1]
+                            )
+                            stream = rag_service.ollama_client.chat_stream(
+                                messages=chat_context.build_messages(
+                                    user_input,
+                                    sources,
+                                    conversation_history=recent_history,
+                                    history_summary=history_summary
+                                ),
+                                temperature=0.7,
+                                max_tokens=settings.max_tokens_per_message
+                            )
+                    
+                    
+                    # 收到第一个片段后再关闭等待提示
+                    if stream is not None:
+                        first_chunk = await anext(stream, "")
+                
+                if stream is None:
+                    # 缓存命中，整体渲染 Markdown
+                    console.print(Markdown(answer))
+                else:
+                    # 逐段输出原始文本：不受终端高度限制，结束后也不再重新渲染
+                    chunks = [first_chunk]
+                    console.print(first_chunk, end="", markup=False, highlight=False, soft_wrap=True)
+                    async for chunk in stream:
+                        chunks.append(chunk)
+                        console.print(chunk, end="", markup=False, highlight=False, soft_wrap=True)
+                    console.print()
+                    answer = "".join(chunks)
+                    
+                    if not no_rag and cacheable:
+                        semantic_cache.put(
+                            query_embedding, answer, sources, namespace=current_id
                         )
                 
                 # 添加助手消息
@@ -161,9 +260,11 @@ def chat(
                     sources=sources
                 )
                 
-                # 显示回答
-                console.print(f"\n[bold green]AI 健身教练[/bold green]")
-                console.print(Markdown(answer))
+                if not no_rag:
+                    chat_context.schedule_summary(
+                        current_id,
+                        conversation_manager.get_conversation(current_id).messages
+                    )
                 
                 # 显示引用来源
                 if sources:
@@ -173,13 +274,23 @@ def chat(
                 
                 console.print()
                 
-            except KeyboardInterrupt:
+            except (KeyboardInterrupt, EOFError, asyncio.CancelledError):
                 console.print("\n[dim]再见！坚持锻炼，保持健康！💪[/dim]")
                 break
             except Exception as e:
                 console.print(f"[red]错误: {e}[/red]")
     
-    asyncio.run(interactive_chat())
+    # 在同一个事件循环中完成服务检查和对话，避免重复创建事件循环
+    async def chat_main():
+        await check_services()
+        current_id = open_conversation()
+        console.print("\n[dim]输入你的健身问题，输入 'quit' 或 'exit' 退出，输入 'help' 查看帮助[/dim]\n")
+        await interactive_chat(current_id)
+    
+    try:
+        run_async(chat_main())
+    except KeyboardInterrupt:
+        pass
 
 
 def print_help():
@@ -202,6 +313,8 @@ def print_help():
 
 def show_conversation_history(conversation_id: str):
     """显示对话历史"""
+    from app.services.conversation_manager import get_conversation_manager, MessageRole
+    
     conversation_manager = get_conversation_manager()
     conversation = conversation_manager.get_conversation(conversation_id)
     
@@ -224,6 +337,8 @@ def list_conversations(
     limit: int = typer.Option(20, "--limit", "-l", help="显示数量限制")
 ):
     """列出所有对话"""
+    from app.services.conversation_manager import get_conversation_manager
+    
     conversation_manager = get_conversation_manager()
     conversations = conversation_manager.list_conversations(limit=limit)
     
@@ -243,12 +358,14 @@ def list_conversations(
     table.add_column("消息数", justify="center", width=8)
     table.add_column("更新时间", width=20)
     
+    # isoformat 输出与 "%Y-%m-%d %H:%M" 相同，但比 strftime 快
+    add_row = table.add_row
     for conv in conversations:
-        table.add_row(
+        add_row(
             conv.id[:8] + "...",
             conv.title,
             str(conv.message_count),
-            conv.updated_at.strftime("%Y-%m-%d %H:%M")
+            conv.updated_at.isoformat(sep=" ", timespec="minutes")
         )
     
     console.print(table)
@@ -259,6 +376,8 @@ def delete_conversation(
     conversation_id: str = typer.Argument(..., help="对话ID")
 ):
     """删除指定对话"""
+    from app.services.conversation_manager import get_conversation_manager
+    
     conversation_manager = get_conversation_manager()
     
     if not Confirm.ask(f"确定要删除对话 {conversation_id[:8]}... 吗?"):
@@ -276,6 +395,8 @@ def delete_conversation(
 @app.command()
 def knowledge_stats():
     """查看知识库统计信息"""
+    from app.services.rag_service import get_rag_service
+    
     rag_service = get_rag_service()
     stats = rag_service.get_knowledge_stats()
     
@@ -301,6 +422,8 @@ def add_knowledge(
     source: Optional[str] = typer.Option(None, "--source", "-s", help="来源名称")
 ):
     """添加知识文档到知识库"""
+    from app.services.rag_service import get_rag_service
+    
     path = Path(file_path)
     
     if not path.exists():
@@ -330,7 +453,7 @@ def add_knowledge(
         else:
             console.print(f"[red]✗ 添加文档失败[/red]")
     
-    asyncio.run(add_doc())
+    run_async(add_doc())
 
 
 @app.command()
@@ -339,6 +462,8 @@ def search_knowledge(
     top_k: int = typer.Option(5, "--top-k", "-k", help="返回结果数量")
 ):
     """搜索知识库"""
+    from app.services.rag_service import get_rag_service
+    
     rag_service = get_rag_service()
     
     async def do_search():
@@ -359,7 +484,7 @@ def search_knowledge(
             )
             console.print(panel)
     
-    asyncio.run(do_search())
+    run_async(do_search())
 
 
 @app.command()
@@ -367,6 +492,8 @@ def clear_knowledge(
     force: bool = typer.Option(False, "--force", "-f", help="强制清空，不确认")
 ):
     """清空知识库"""
+    from app.services.rag_service import get_rag_service
+    
     if not force:
         if not Confirm.ask("[red]确定要清空知识库吗? 此操作不可恢复![/red]"):
             console.print("[dim]已取消[/dim]")
@@ -384,9 +511,24 @@ def clear_knowledge(
 @app.command()
 def health():
     """检查服务健康状态"""
+    from app.services.rag_service import get_rag_service
+    from app.services.ollama_client import get_ollama_client
+    
+    def load_knowledge_stats():
+        return get_rag_service().get_knowledge_stats()
+    
     async def check():
         ollama_client = get_ollama_client()
-        health_status = await ollama_client.health_check()
+        
+        # Ollama 探测与向量数据库统计互不依赖，并发执行
+        # 向量数据库统计是同步调用，放到线程中避免阻塞事件循环
+        health_status, stats = await asyncio.gather(
+            ollama_client.health_check(),
+            asyncio.to_thread(load_knowledge_stats),
+            return_exceptions=True
+        )
+        if isinstance(health_status, Exception):
+            health_status = {"connected": False, "error": str(health_status)}
         
         table = Table(
             title="服务健康状态",
@@ -440,24 +582,22 @@ def health():
             )
         
         # 向量数据库状态
-        try:
-            rag_service = get_rag_service()
-            stats = rag_service.get_knowledge_stats()
+        if isinstance(stats, Exception):
             table.add_row(
                 "向量数据库",
-                "[green]✓ 正常[/green]",
-                f"{stats['total_chunks']} 个知识块"
+                "[red]✗ 异常[/red]",
+                str(stats)
             )
-        except Exception as e:
+        else:
             table.add_row(
                 "向量数据库",
-                "[red]✗ 异常[/red]",
-                str(e)
+                "[green]✓ 正常[/green]",
+                f"{stats['total_chunks']} 个知识块"
             )
         
         console.print(table)
     
-    asyncio.run(check())
+    run_async(check())
 
 
 if __name__ == "__main__":
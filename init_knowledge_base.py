@@ -4,14 +4,30 @@
 import asyncio
 import os
 from pathlib import Path
+
+try:
+    from uvloop import run as run_async
+except ImportError:
+    # Windows 等平台没有 uvloop，回退到默认事件循环
+    from asyncio import run as run_async
+
 from rich.console import Console
-from rich.progress import Progress, SpinnerColumn, TextColumn
+from rich.progress import Progress, SpinnerColumn, TextColumn, MofNCompleteColumn
 
+from app.core.config import settings
 from app.core.logger import logger
 from app.services.rag_service import get_rag_service
 
 console = Console()
 
+# 支持导入的文档扩展名，由配置项 supported_extensions 决定
+SUPPORTED_EXTENSIONS = frozenset(ext.lower() for ext in settings.supported_extensions)
+
+# 同时导入的最大文件数
+# 每个文件内部还会以 8 个为一批并发请求嵌入接口，
+# 总并发约为 IMPORT_CONCURRENCY * 8，过高会使本地 Ollama 超时并导致整个文件导入失败
+IMPORT_CONCURRENCY = 2
+
 
 async def init_knowledge_base():
     """初始化知识库"""
@@ -28,11 +44,12 @@ async def init_knowledge_base():
         return
     
     # 获取所有文档文件
-    supported_extensions = ['.txt', '.md', '.pdf', '.docx']
-    files = [
-        f for f in kb_dir.iterdir() 
-        if f.is_file() and f.suffix.lower() in supported_extensions
-    ]
+    # scandir 的 DirEntry 会缓存文件类型，无需对每个条目单独 stat
+    with os.scandir(kb_dir) as entries:
+        files = [
+            Path(entry.path) for entry in entries
+            if entry.is_file() and os.path.splitext(entry.name)[1].lower() in SUPPORTED_EXTENSIONS
+        ]
     
     if not files:
         console.print("[yellow]知识库中没有文档文件[/yellow]")
@@ -40,35 +57,36 @@ async def init_knowledge_base():
     
     console.print(f"发现 {len(files)} 个文档文件:\n")
     
-    # 导入文档
-    success_count = 0
-    total_chunks = 0
+    # 并发导入文档，限制同时处理的文件数
+    semaphore = asyncio.Semaphore(IMPORT_CONCURRENCY)
     
     with Progress(
         SpinnerColumn(),
         TextColumn("[progress.description]{task.description}"),
+        MofNCompleteColumn(),
         console=console
     ) as progress:
+        task = progress.add_task("[cyan]导入文档...[/cyan]", total=len(files))
         
-        for file_path in files:
-            task = progress.add_task(
-                f"[cyan]导入 {file_path.name}...[/cyan]", 
-                total=None
-            )
+        async def import_file(file_path: Path) -> tuple[bool, int]:
+            async with semaphore:
+                success, chunks = await rag_service.add_knowledge_from_file(
+                    str(file_path),
+                    metadata={"category": "fitness_knowledge"}
+                )
             
-            success, chunks = await rag_service.add_knowledge_from_file(
-                str(file_path),
-                metadata={"category": "fitness_knowledge"}
-            )
-            
-            progress.remove_task(task)
+            progress.update(task, advance=1)
             
             if success:
-                success_count += 1
-                total_chunks += chunks
                 console.print(f"[green]✓[/green] {file_path.name} - {chunks} 个知识块")
             else:
                 console.print(f"[red]✗[/red] {file_path.name} - 导入失败")
+            return success, chunks
+        
+        results = await asyncio.gather(*(import_file(f) for f in files))
+    
+    success_count = sum(1 for success, _ in results if success)
+    total_chunks = sum(chunks for success, chunks in results if success)
     
     # 显示统计
     console.print(f"\n[bold]导入完成:[/bold]")
@@ -84,4 +102,4 @@ async def init_knowledge_base():
 
 
 if __name__ == "__main__":
-    asyncio.run(init_knowledge_base())
+    run_async(init_knowledge_base())
@@ -5,7 +5,9 @@ from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import FileResponse
 from contextlib import asynccontextmanager
+import asyncio
 import os
+import time
 
 from app.core.config import settings
 from app.core.logger import logger
@@ -18,10 +20,22 @@ async def lifespan(app: FastAPI):
     # 启动时执行
     logger.info(f"Starting {settings.app_name} v{settings.app_version}")
     
-    # 检查 Ollama 连接
+    # 检查 Ollama 连接，同时在线程中预先初始化 RAG 服务（加载 ChromaDB 集合），
+    # 避免第一个请求承担冷启动开销
     from app.services.ollama_client import get_ollama_client
+    from app.services.rag_service import get_rag_service
     ollama_client = get_ollama_client()
-    health = await ollama_client.health_check()
+    
+    start_time = time.perf_counter()
+    health, rag_service = await asyncio.gather(
+        ollama_client.health_check(),
+        asyncio.to_thread(get_rag_service),
+        return_exceptions=True
+    )
+    logger.info(f"服务预热完成，耗时 {time.perf_counter() - start_time:.2f}s")
+    
+    if isinstance(rag_service, Exception):
+        logger.error(f"RAG 服务初始化失败: {rag_service}")
     
     if health["connected"]:
         logger.info(f"Ollama 已连接，可用模型: {health['available_models']}")